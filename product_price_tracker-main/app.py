@@ -1,31 +1,157 @@
 """Flask API server for Price Tracker frontend."""
 
 import asyncio
-from threading import Thread
+import atexit
+import time
+from threading import Lock, Thread
 
+import orjson
+from apscheduler.executors.pool import ThreadPoolExecutor
 from apscheduler.schedulers.background import BackgroundScheduler
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_from_directory, stream_with_context
+from flask.json.provider import JSONProvider
 from flask_cors import CORS
+from pydantic import ValidationError
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only the single-process dev server runs
+    fcntl = None
 
 from utils import playwright_price_scraper
-from utils.common import fetch_products
-from utils.db import get_price_history, get_product_summary, init_db
+from utils.db import (
+    DB_PATH,
+    data_version,
+    get_product_summary,
+    init_db,
+    insert_product,
+    list_products,
+    remove_product,
+    stream_history,
+)
+from utils.schemas import ProductIn
+
+
+class ORJSONProvider(JSONProvider):
+    """Serialize API responses with orjson instead of the stdlib json module."""
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
 
 app = Flask(__name__, static_folder='static', static_url_path='')
+app.json = ORJSONProvider(app)
 CORS(app)
 
 # Initialize database on startup
 init_db()
 
 # Scheduler for automatic price scraping every 30 minutes
-scheduler = BackgroundScheduler(daemon=True)
+# (single worker thread so two scrapes never run at once)
+scheduler = BackgroundScheduler(daemon=True, executors={"default": ThreadPoolExecutor(1)})
+
+# Cached /api/products/summary data, cleared whenever products or prices change.
+# Each clear bumps "generation", so a query that started before the change
+# never stores its (stale) result. Changes made by other Gunicorn workers are
+# caught by comparing SQLite's data_version with the one seen at fill time.
+SUMMARY_CACHE_TTL = 60  # seconds
+_summary_cache = {"expires": 0.0, "data": None, "generation": 0, "data_version": None}
+_summary_lock = Lock()
+
+def clear_summary_cache():
+    """Make the next summary request re-query the database."""
+    with _summary_lock:
+        _summary_cache["generation"] += 1
+        _summary_cache["expires"] = 0.0
+
+# All scrapes run on one long-lived event loop, so the Playwright browser it owns
+# stays open between runs instead of being relaunched every time
+SCRAPE_TIMEOUT = 25 * 60  # seconds
+scrape_loop = asyncio.new_event_loop()
+Thread(target=scrape_loop.run_forever, daemon=True, name="scrape-loop").start()
+scrape_loop.call_soon_threadsafe(playwright_price_scraper.install_eager_task_factory)
+
+def _close_browser(timeout):
+    """Close the shared browser on the scrape loop, logging rather than raising errors."""
+    future = asyncio.run_coroutine_threadsafe(playwright_price_scraper.close_browser(), scrape_loop)
+    try:
+        future.result(timeout=timeout)
+    except Exception as e:
+        print(f"Error closing browser: {e}")
+
+def _shutdown_scrape_loop():
+    """Close the shared browser and stop the scrape loop at interpreter exit."""
+    _close_browser(timeout=10)
+    scrape_loop.call_soon_threadsafe(scrape_loop.stop)
+
+atexit.register(_shutdown_scrape_loop)
+
+# Only one scrape runs at a time: scrape_lock covers this process's threads and
+# an flock on SCRAPE_LOCK_PATH covers the other Gunicorn workers
+scrape_lock = Lock()
+SCRAPE_LOCK_PATH = DB_PATH.with_suffix(".scrape.lock")
+
+# True in the process running the scheduler; only it keeps Chromium open between runs
+background_jobs_started = False
+
+def _acquire_scrape_locks():
+    """Take both scrape locks without blocking.
+    
+    Returns the open lock file holding the flock, or None if a scrape is
+    already running in this or another worker. Pass it to _run_scrape().
+    """
+    if not scrape_lock.acquire(blocking=False):
+        return None
+    lock_file = None
+    try:
+        lock_file = open(SCRAPE_LOCK_PATH, "w")
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return lock_file
+    except Exception as e:
+        if lock_file is not None:
+            lock_file.close()
+        scrape_lock.release()
+        if isinstance(e, BlockingIOError):
+            return None  # another worker holds the flock
+        raise
+
+def _run_scrape(lock_file):
+    """Run one scrape, then release the locks taken by _acquire_scrape_locks()."""
+    try:
+        # wait_for cancels a scrape that overruns and only returns once it has
+        # finished unwinding, so the lock is never released under a live scrape
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(playwright_price_scraper.track_prices(), SCRAPE_TIMEOUT), scrape_loop,
+        )
+        try:
+            future.result()
+        finally:
+            if not background_jobs_started:
+                _close_browser(timeout=30)
+    except TimeoutError:
+        print(f"Scrape timed out after {SCRAPE_TIMEOUT} seconds and was cancelled")
+    except Exception as e:
+        print(f"Error in scheduled scrape: {e}")
+    finally:
+        lock_file.close()  # releases the flock
+        clear_summary_cache()
+        scrape_lock.release()
 
 def run_scrape_job():
     """Background job to run price scraping."""
     try:
-        asyncio.run(playwright_price_scraper.track_prices())
+        lock_file = _acquire_scrape_locks()
     except Exception as e:
         print(f"Error in scheduled scrape: {e}")
+        return
+    if lock_file is None:
+        print("Scrape already in progress, skipping")
+        return
+    _run_scrape(lock_file)
 
 # Schedule scraping every 30 minutes
 scheduler.add_job(
@@ -34,23 +160,31 @@ scheduler.add_job(
     minutes=30,
     id='price_scrape_job',
     name='Scrape prices every 30 minutes',
-    replace_existing=True
+    replace_existing=True,
+    max_instances=1,
+    coalesce=True,
+    misfire_grace_time=300
 )
 
-# Start scheduler
-scheduler.start()
-print("Scheduler started - Price scraping will run every 30 minutes")
-
 # Run initial scrape on startup (after a short delay)
-import time
 def initial_scrape():
     """Run initial scrape after server starts."""
     time.sleep(5)  # Wait 5 seconds for server to fully start
     print("Running initial price scrape...")
     run_scrape_job()
 
-initial_thread = Thread(target=initial_scrape, daemon=True)
-initial_thread.start()
+def start_background_jobs():
+    """Start the scrape scheduler and the initial scrape.
+    
+    Call once per deployment; under Gunicorn, wsgi.py makes sure only one worker does.
+    """
+    global background_jobs_started
+    background_jobs_started = True
+    scheduler.start()
+    print("Scheduler started - Price scraping will run every 30 minutes")
+    
+    initial_thread = Thread(target=initial_scrape, daemon=True)
+    initial_thread.start()
 
 
 @app.route("/")
@@ -63,7 +197,7 @@ def index():
 def get_products():
     """Get list of products being tracked."""
     try:
-        products = fetch_products()
+        products = list_products()
         return jsonify({"success": True, "data": products})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -71,64 +205,27 @@ def get_products():
 
 @app.route("/api/products", methods=["POST"])
 def add_product():
-    """Add a new product to products.csv."""
+    """Add a new product to track."""
     try:
-        data = request.get_json()
-        
-        # Validate required fields
-        required_fields = ["name", "url", "platform", "threshold"]
-        for field in required_fields:
-            if field not in data:
-                return jsonify({"success": False, "error": f"Missing required field: {field}"}), 400
-        
-        # Validate platform
-        platform = data["platform"].lower()
-        if platform not in ["amazon", "flipkart"]:
-            return jsonify({"success": False, "error": "Platform must be 'amazon' or 'flipkart'"}), 400
-        
-        # Validate threshold
+        # Validate all fields in one pass
         try:
-            threshold = float(data["threshold"])
-            if threshold <= 0:
-                return jsonify({"success": False, "error": "Threshold must be greater than 0"}), 400
-        except (ValueError, TypeError):
-            return jsonify({"success": False, "error": "Threshold must be a valid number"}), 400
-        
-        # Validate URL contains platform
-        url = data["url"].lower()
-        if platform not in url:
-            return jsonify({"success": False, "error": f"URL must be from {platform}"}), 400
-        
-        # Read existing products
-        products = fetch_products()
-        
-        # Check if product already exists
-        for product in products:
-            if product["name"].lower() == data["name"].lower():
-                return jsonify({"success": False, "error": "Product with this name already exists"}), 400
+            product = ProductIn.model_validate(request.get_json(silent=True))
+        except ValidationError as e:
+            errors = e.errors(include_url=False, include_input=False)
+            first = errors[0]
+            field = ".".join(str(part) for part in first["loc"])
+            message = f"{field}: {first['msg']}" if field else first["msg"]
+            return jsonify({"success": False, "error": message, "details": errors}), 400
         
-        # Add new product to CSV
-        import csv
-        from utils.config import PRODUCTS_FILE
-        
-        with open(PRODUCTS_FILE, "a", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                data["name"],
-                data["url"],
-                platform,
-                threshold
-            ])
+        # Add new product (names are unique, case-insensitive)
+        if not insert_product(product.name, product.url, product.platform, product.threshold):
+            return jsonify({"success": False, "error": "Product with this name already exists"}), 400
+        clear_summary_cache()
         
         return jsonify({
             "success": True,
             "message": "Product added successfully",
-            "data": {
-                "name": data["name"],
-                "url": data["url"],
-                "platform": platform,
-                "threshold": threshold
-            }
+            "data": product.model_dump()
         })
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -136,37 +233,11 @@ def add_product():
 
 @app.route("/api/products/<product_name>", methods=["DELETE"])
 def delete_product(product_name):
-    """Delete a product from products.csv."""
+    """Delete a tracked product."""
     try:
-        import csv
-        from utils.config import PRODUCTS_FILE
-        
-        # Read all products
-        products = fetch_products()
-        
-        # Check if product exists
-        product_found = False
-        for product in products:
-            if product["name"].lower() == product_name.lower():
-                product_found = True
-                break
-        
-        if not product_found:
+        if not remove_product(product_name):
             return jsonify({"success": False, "error": "Product not found"}), 404
-        
-        # Write all products except the one to delete
-        with open(PRODUCTS_FILE, "w", newline="", encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["name", "url", "platform", "threshold"])  # Header
-            
-            for product in products:
-                if product["name"].lower() != product_name.lower():
-                    writer.writerow([
-                        product["name"],
-                        product["url"],
-                        product["platform"],
-                        product["threshold"]
-                    ])
+        clear_summary_cache()
         
         return jsonify({
             "success": True,
@@ -178,51 +249,22 @@ def delete_product(product_name):
 
 @app.route("/api/products/summary", methods=["GET"])
 def get_products_summary():
-    """Get summary of all products with latest prices, merged with products.csv."""
+    """Get summary of all tracked products with latest prices."""
     try:
-        # Get products from CSV (source of truth)
-        csv_products = fetch_products()
-        # Get price history from database
-        db_summary = get_product_summary()
-        
-        # Create a dictionary of database data by product name
-        db_dict = {item['name']: item for item in db_summary}
+        now = time.monotonic()
+        with _summary_lock:
+            version = data_version()
+            if now < _summary_cache["expires"] and version == _summary_cache["data_version"]:
+                return jsonify({"success": True, "data": _summary_cache["data"]})
+            generation = _summary_cache["generation"]
         
-        # Merge CSV products with database data
-        merged_products = []
-        for csv_product in csv_products:
-            product_name = csv_product['name']
-            if product_name in db_dict:
-                # Product exists in database, merge data
-                db_product = db_dict[product_name]
-                merged_products.append({
-                    'name': csv_product['name'],
-                    'url': csv_product['url'],
-                    'platform': csv_product['platform'],
-                    'threshold': csv_product['threshold'],
-                    'current_price': db_product.get('current_price', 0),
-                    'original_price': db_product.get('original_price', csv_product['threshold']),
-                    'previous_price': db_product.get('previous_price'),
-                    'price_change': db_product.get('price_change'),
-                    'price_change_percent': db_product.get('price_change_percent'),
-                    'last_updated': db_product.get('last_updated')
-                })
-            else:
-                # Product not yet scraped, show from CSV only
-                merged_products.append({
-                    'name': csv_product['name'],
-                    'url': csv_product['url'],
-                    'platform': csv_product['platform'],
-                    'threshold': csv_product['threshold'],
-                    'current_price': None,
-                    'original_price': None,
-                    'previous_price': None,
-                    'price_change': None,
-                    'price_change_percent': None,
-                    'last_updated': None
-                })
-        
-        return jsonify({"success": True, "data": merged_products})
+        data = get_product_summary()
+        with _summary_lock:
+            if generation == _summary_cache["generation"]:
+                _summary_cache["data"] = data
+                _summary_cache["data_version"] = version
+                _summary_cache["expires"] = now + SUMMARY_CACHE_TTL
+        return jsonify({"success": True, "data": data})
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -234,8 +276,21 @@ def get_price_history_endpoint():
         name = request.args.get("name")
         limit = int(request.args.get("limit", 100))
         
-        history = get_price_history(name=name, limit=limit)
-        return jsonify({"success": True, "data": history})
+        # Run the query now so DB errors still get the 500 response below, then
+        # stream rows as they are read so memory stays flat for large limits
+        rows = stream_history(name=name, limit=limit)
+        
+        def generate():
+            yield b'{"success":true,"data":['
+            first = True
+            for row in rows:
+                if not first:
+                    yield b','
+                first = False
+                yield orjson.dumps(dict(row))
+            yield b']}'
+        
+        return Response(stream_with_context(generate()), mimetype="application/json")
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -244,11 +299,13 @@ def get_price_history_endpoint():
 def trigger_scrape():
     """Manually trigger a price scraping operation."""
     try:
-        # Run scraping in background thread to avoid blocking
-        def run_scrape():
-            asyncio.run(playwright_price_scraper.track_prices())
+        # Take the locks here so the caller learns if a scrape is already running
+        lock_file = _acquire_scrape_locks()
+        if lock_file is None:
+            return jsonify({"success": False, "error": "Scrape already running"}), 409
         
-        thread = Thread(target=run_scrape, daemon=True)
+        # Run scraping in background thread to avoid blocking
+        thread = Thread(target=_run_scrape, args=(lock_file,), daemon=True)
         thread.start()
         
         return jsonify({
@@ -266,5 +323,6 @@ def health_check():
 
 
 if __name__ == "__main__":
+    start_background_jobs()
     app.run(debug=True, host="0.0.0.0", port=5000)
 
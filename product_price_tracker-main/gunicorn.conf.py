@@ -0,0 +1,11 @@
+"""Gunicorn settings for the Price Tracker API: `uv run gunicorn wsgi:app`."""
+
+import multiprocessing
+
+bind = "0.0.0.0:5000"
+workers = multiprocessing.cpu_count() * 2 + 1
+# Threaded workers: each worker keeps its own SQLite connection (WAL lets them read
+# concurrently), and the scraper's asyncio/Playwright thread needs real threads.
+worker_class = "gthread"
+threads = 8
+timeout = 60
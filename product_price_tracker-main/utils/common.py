@@ -3,6 +3,8 @@
 
 # ruff: noqa: BLE001
 import csv
+import os
+import re
 import traceback
 from collections.abc import Callable
 from typing import ParamSpec, TypeVar
@@ -17,6 +19,11 @@ console = Console()
 P = ParamSpec("P")
 R = TypeVar("R")
 
+# Parsed products.csv, reused until the file's mtime changes
+_PRODUCTS_CACHE = {"mtime": None, "data": None}
+# Strips everything except digits and the decimal point from thresholds
+_THRESH_RE = re.compile(r'[^\d.]')
+
 def safe_run(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R | None:
     """Run a function safely.
 
@@ -32,19 +39,37 @@ def safe_run(func: Callable[P, R], *args: P.args, **kwargs: P.kwargs) -> R | Non
         return None
 
 def fetch_products() -> list[dict]:
-    """Fetch product list from products.py."""
+    """Fetch product list from products.csv.
+
+    The parsed list is cached and only re-read when the file's mtime changes.
+    """
     try:
+        mtime = os.stat(PRODUCTS_FILE).st_mtime_ns
+        if mtime == _PRODUCTS_CACHE["mtime"]:
+            return _PRODUCTS_CACHE["data"]
         products = []
         # Read products from CSV
         with open(PRODUCTS_FILE, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f)
+            reader = csv.reader(f)
+            # Map column names to positions once instead of building a dict per row
+            header = [h.strip() for h in next(reader, [])]
+            idx = {h: i for i, h in enumerate(header)}
+            i_name, i_url, i_threshold = idx["name"], idx["url"], idx["threshold"]
+            i_platform = idx.get("platform")
+            width = len(header)
             for row_num, row in enumerate(reader, start=2):  # start=2 because row 1 is header
+                if not row:
+                    continue  # Blank line (DictReader skipped these too)
                 try:
+                    if len(row) < width:
+                        row += [""] * (width - len(row))
+                    name, url = row[i_name].strip(), row[i_url].strip()
+                    platform = row[i_platform] if i_platform is not None else ""
+                    
                     # Clean and validate threshold value
-                    threshold_str = str(row.get("threshold", "")).strip()
+                    threshold_str = row[i_threshold].strip()
                     # Remove any non-numeric characters except decimal point
-                    import re
-                    threshold_clean = re.sub(r'[^\d.]', '', threshold_str)
+                    threshold_clean = _THRESH_RE.sub('', threshold_str)
                     
                     if not threshold_clean:
                         console.print(f"[yellow]Warning: Invalid threshold in row {row_num}, skipping product[/]")
@@ -53,17 +78,17 @@ def fetch_products() -> list[dict]:
                     threshold = float(threshold_clean)
                     
                     # Validate other fields
-                    if not row.get("name") or not row.get("url"):
+                    if not name or not url:
                         console.print(f"[yellow]Warning: Missing name or URL in row {row_num}, skipping[/]")
                         continue
                     
                     products.append({
-                        "name": row["name"].strip(),
-                        "url": row["url"].strip(),
-                        "platform": row.get("platform", "").lower().strip(),
+                        "name": name,
+                        "url": url,
+                        "platform": platform.lower().strip(),
                         "threshold": threshold,
                     })
-                except (ValueError, KeyError) as e:
+                except ValueError as e:
                     console.print(f"[red]Error parsing row {row_num}:[/] {e}")
                     console.print(f"[red]Row data:[/] {row}")
                     continue
@@ -73,6 +98,8 @@ def fetch_products() -> list[dict]:
     except Exception as e:
         console.print("[red]Error importing PRODUCTS:[/]", e)
         return []
+    _PRODUCTS_CACHE["mtime"] = mtime
+    _PRODUCTS_CACHE["data"] = products
     return products
 
 def display_price_table(results: list[dict]) -> None:
@@ -82,6 +109,7 @@ def display_price_table(results: list[dict]) -> None:
     - name: str
     - current_price: float
     - original_price: float
+    - discount: float (optional; computed from the prices when missing)
     """
     table = Table(title="Price Tracker Results")
 
@@ -91,22 +119,20 @@ def display_price_table(results: list[dict]) -> None:
     table.add_column("Discount (%)", justify="right", style="magenta")
 
     # Remove duplicates by product name (keep the first occurrence)
-    seen_products = set()
-    unique_results = []
+    seen = {}
     for item in results:
-        name = item.get("name", "Unknown")
-        if name not in seen_products:
-            seen_products.add(name)
-            unique_results.append(item)
+        seen.setdefault(item.get("name", "Unknown"), item)
+    unique_results = list(seen.values())
 
     for item in unique_results:
         name = item.get("name", "Unknown")
         current = item.get("current_price", 0)
         desired = item.get("threshold", 0)
-        original = item.get("original_price", 0)
-        discount = 0
-        if original > 0:
-            discount = round((original - current) / original * 100, 2)
+        # scrape_product() already computed the discount; only derive it when absent
+        discount = item.get("discount")
+        if discount is None:
+            original = item.get("original_price", 0)
+            discount = round((original - current) / original * 100, 2) if original > 0 else 0
         table.add_row(name, f"{current:.2f}", f"{desired:.2f}", f"{discount:.2f}%")
 
     console.print(table)
@@ -1,173 +1,257 @@
-"""SQLite helpers for storing price history."""
+"""SQLite helpers for storing tracked products and price history."""
 
 import sqlite3
-from datetime import datetime
+import threading
+from collections.abc import Iterator
 from pathlib import Path
 
+from utils.common import fetch_products
+
 DB_PATH = Path("price_tracker.db")
 
+# One connection per process, shared by all threads and opened on first use.
+# It runs in autocommit mode; writes are serialized by _lock. WAL journaling lets
+# other processes (e.g. Gunicorn workers) keep reading while one of them writes.
+_CONN: sqlite3.Connection | None = None
+_conn_lock = threading.Lock()
+_lock = threading.Lock()
+
+def _get_conn() -> sqlite3.Connection:
+    """Return the shared connection, opening it on first use."""
+    global _CONN
+    with _conn_lock:
+        if _CONN is None:
+            conn = sqlite3.connect(DB_PATH, check_same_thread=False, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            _CONN = conn
+    return _CONN
+
+def data_version() -> int:
+    """Return a counter that changes whenever another connection commits.
+    
+    This process's own writes through the shared connection do not change it.
+    """
+    return _get_conn().execute("PRAGMA data_version").fetchone()[0]
+
 def init_db() -> None:
     """Initialize the SQLite database and create tables if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    with _lock:
+        c = _get_conn().cursor()
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS price_history (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                url TEXT,
+                platform TEXT,
+                price REAL,
+                original_price REAL,
+                threshold REAL,
+                date TIMESTAMP
+            )
+        """)
+        # Add original_price column if it doesn't exist (for existing databases)
+        try:
+            c.execute("ALTER TABLE price_history ADD COLUMN original_price REAL")
+        except sqlite3.OperationalError:
+            pass  # Column already exists
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_price_name_date
+            ON price_history(name, date DESC)
+        """)
+        c.execute("""
+            CREATE INDEX IF NOT EXISTS idx_price_date
+            ON price_history(date DESC)
+        """)
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS products (
+                name TEXT PRIMARY KEY COLLATE NOCASE,
+                url TEXT,
+                platform TEXT,
+                threshold REAL
+            )
+        """)
+        # One-time migrations, recorded in user_version
+        version = c.execute("PRAGMA user_version").fetchone()[0]
+        if version < 1:
+            # Import products.csv
+            c.execute("BEGIN")
+            c.executemany("""
+                INSERT OR IGNORE INTO products (name, url, platform, threshold)
+                VALUES (:name, :url, :platform, :threshold)
+            """, fetch_products())
+            c.execute("PRAGMA user_version = 1")
+            c.execute("COMMIT")
+        if version < 2:
+            # Gather planner statistics once so the price_history indexes get used
+            c.execute("BEGIN")
+            c.execute("ANALYZE")
+            c.execute("PRAGMA user_version = 2")
+            c.execute("COMMIT")
+
+def list_products() -> list[dict]:
+    """Retrieve tracked products in the order they were added."""
+    c = _get_conn().cursor()
     c.execute("""
-        CREATE TABLE IF NOT EXISTS price_history (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT,
-            url TEXT,
-            platform TEXT,
-            price REAL,
-            original_price REAL,
-            threshold REAL,
-            date TIMESTAMP
-        )
+        SELECT name, url, platform, threshold
+        FROM products
+        ORDER BY rowid
     """)
-    # Add original_price column if it doesn't exist (for existing databases)
-    try:
-        c.execute("ALTER TABLE price_history ADD COLUMN original_price REAL")
-    except sqlite3.OperationalError:
-        pass  # Column already exists
-    conn.commit()
-    conn.close()
-
-def save_price(name: str, url: str, platform: str, price: float, threshold: float, original_price: float = None) -> None:
-    """Save a price entry to the database.
+    return [dict(row) for row in c.fetchall()]
+
+def insert_product(name: str, url: str, platform: str, threshold: float) -> bool:
+    """Add a product to track.
     
-    Args:
-        name: Product name
-        url: Product URL
-        platform: Platform (amazon/flipkart)
-        price: Current price
-        threshold: Price threshold
-        original_price: Original price (if None, will use max price from history)
+    Returns:
+        False if a product with the same name (case-insensitive) already exists
     """
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
-    
-    # If original_price not provided, get max price from history for this product
-    if original_price is None:
+    with _lock:
+        c = _get_conn().cursor()
         c.execute("""
-            SELECT MAX(price) FROM price_history WHERE name = ?
-        """, (name,))
-        max_price = c.fetchone()[0]
-        original_price = max_price if max_price and max_price > price else price
+            INSERT OR IGNORE INTO products (name, url, platform, threshold)
+            VALUES (?, ?, ?, ?)
+        """, (name, url, platform, threshold))
+        return c.rowcount == 1
+
+def remove_product(name: str) -> bool:
+    """Stop tracking a product (name match is case-insensitive).
     
-    c.execute("""
-        INSERT INTO price_history (name, url, platform, price, original_price, threshold, date)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (name, url, platform, price, original_price, threshold, datetime.now()))
-    conn.commit()
-    conn.close()
+    Returns:
+        False if no such product exists
+    """
+    with _lock:
+        c = _get_conn().cursor()
+        c.execute("DELETE FROM products WHERE name = ?", (name,))
+        return c.rowcount > 0
+
+def save_prices_bulk(rows: list[tuple]) -> None:
+    """Save many price entries in a single transaction.
+    
+    Args:
+        rows: Tuples of (name, url, platform, price, original_price, threshold, date)
+    """
+    if not rows:
+        return
+    with _lock:
+        conn = _get_conn()
+        conn.execute("BEGIN")
+        try:
+            conn.executemany("""
+                INSERT INTO price_history (name, url, platform, price, original_price, threshold, date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
 
 def get_latest_prices() -> list[tuple]:
     """Retrieve the latest price entries from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    c = conn.cursor()
+    c = _get_conn().cursor()
     c.execute("""
         SELECT name, price, threshold, date
         FROM price_history
         ORDER BY date DESC
     """)
-    rows = c.fetchall()
-    conn.close()
-    return rows
+    return [tuple(row) for row in c.fetchall()]
 
-def get_price_history(name: str = None, limit: int = 100) -> list[dict]:
-    """Retrieve price history from the database.
+def stream_history(name: str = None, limit: int = 100, batch_size: int = 200) -> Iterator[sqlite3.Row]:
+    """Run the price history query and iterate its rows newest-first in batches.
+    
+    The query executes before this returns, so errors surface to the caller
+    instead of partway through iteration. Rows are read on a dedicated
+    connection, closed when iteration ends, so a slow client never pins the
+    shared connection to an old snapshot.
     
     Args:
         name: Optional product name to filter by
         limit: Maximum number of records to return
-    
-    Returns:
-        List of dictionaries with price history data
+        batch_size: Rows pulled from SQLite per fetch
     """
     conn = sqlite3.connect(DB_PATH)
     conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    try:
+        c = conn.cursor()
+        if name:
+            c.execute("""
+                SELECT id, name, url, platform, price, original_price, threshold, date
+                FROM price_history
+                WHERE name = ?
+                ORDER BY date DESC
+                LIMIT ?
+            """, (name, limit))
+        else:
+            c.execute("""
+                SELECT id, name, url, platform, price, original_price, threshold, date
+                FROM price_history
+                ORDER BY date DESC
+                LIMIT ?
+            """, (limit,))
+    except Exception:
+        conn.close()
+        raise
     
-    if name:
-        c.execute("""
-            SELECT id, name, url, platform, price, original_price, threshold, date
-            FROM price_history
-            WHERE name = ?
-            ORDER BY date DESC
-            LIMIT ?
-        """, (name, limit))
-    else:
-        c.execute("""
-            SELECT id, name, url, platform, price, original_price, threshold, date
-            FROM price_history
-            ORDER BY date DESC
-            LIMIT ?
-        """, (limit,))
+    return _iter_rows(conn, c, batch_size)
+
+def _iter_rows(conn: sqlite3.Connection, c: sqlite3.Cursor, batch_size: int) -> Iterator[sqlite3.Row]:
+    """Yield rows from an executed cursor batch_size at a time, then close conn."""
+    try:
+        while rows := c.fetchmany(batch_size):
+            yield from rows
+    finally:
+        conn.close()
+
+def get_price_history(name: str = None, limit: int = 100) -> list[dict]:
+    """Retrieve price history from the database.
     
-    rows = c.fetchall()
-    conn.close()
+    Args:
+        name: Optional product name to filter by
+        limit: Maximum number of records to return
     
-    return [dict(row) for row in rows]
+    Returns:
+        List of dictionaries with price history data
+    """
+    return [dict(row) for row in stream_history(name, limit)]
 
 def get_product_summary() -> list[dict]:
-    """Get summary of all products with their latest prices."""
-    conn = sqlite3.connect(DB_PATH)
-    conn.row_factory = sqlite3.Row
-    c = conn.cursor()
+    """Get summary of all tracked products with their latest prices.
     
-    # Get latest price for each product (ensure unique by name)
+    Products that have not been scraped yet have None for every price field.
+    """
+    c = _get_conn().cursor()
+    
+    # Rank each product's history newest-first, pivot the latest two rows into
+    # current/previous columns, and attach them to the products table
     c.execute("""
-        SELECT DISTINCT 
-            ph1.name, 
-            ph1.url, 
-            ph1.platform, 
-            ph1.price as current_price, 
-            ph1.original_price, 
-            ph1.threshold, 
-            ph1.date,
-            (SELECT price FROM price_history ph2 
-             WHERE ph2.name = ph1.name 
-             ORDER BY date DESC LIMIT 1 OFFSET 1) as previous_price
-        FROM price_history ph1
-        INNER JOIN (
-            SELECT name, MAX(date) as max_date
-            FROM price_history 
+        WITH ranked AS (
+            SELECT name, price, original_price, date,
+                   ROW_NUMBER() OVER (PARTITION BY name ORDER BY date DESC) AS rn
+            FROM price_history
+        ),
+        latest AS (
+            SELECT name,
+                   MAX(CASE WHEN rn = 1 THEN price END) AS current_price,
+                   MAX(CASE WHEN rn = 1 THEN original_price END) AS original_price,
+                   MAX(CASE WHEN rn = 1 THEN date END) AS last_updated,
+                   MAX(CASE WHEN rn = 2 THEN price END) AS previous_price
+            FROM ranked
+            WHERE rn <= 2
             GROUP BY name
-        ) latest ON ph1.name = latest.name AND ph1.date = latest.max_date
-        ORDER BY ph1.name
+        )
+        SELECT p.name, p.url, p.platform, p.threshold,
+               l.current_price,
+               -- Use stored original_price or fallback to current_price
+               COALESCE(NULLIF(l.original_price, 0), l.current_price) AS original_price,
+               l.previous_price,
+               l.current_price - NULLIF(l.previous_price, 0) AS price_change,
+               (l.current_price - NULLIF(l.previous_price, 0)) / l.previous_price * 100
+                   AS price_change_percent,
+               l.last_updated
+        FROM products p
+        LEFT JOIN latest l ON l.name = p.name
+        ORDER BY p.rowid
     """)
     
-    rows = c.fetchall()
-    conn.close()
-    
-    # Use a dictionary to ensure unique products by name (in case of duplicates)
-    products_dict = {}
-    for row in rows:
-        data = dict(row)
-        current_price = data['current_price']
-        previous_price = data.get('previous_price')
-        # Use stored original_price or fallback to current_price
-        original_price = data.get('original_price') or current_price
-        
-        if previous_price:
-            price_change = current_price - previous_price
-            price_change_percent = ((current_price - previous_price) / previous_price) * 100
-        else:
-            price_change = None
-            price_change_percent = None
-        
-        product_name = data['name']
-        # Keep only the first entry for each product name (should already be unique from SQL)
-        if product_name not in products_dict:
-            products_dict[product_name] = {
-                'name': product_name,
-                'url': data['url'],
-                'platform': data['platform'],
-                'current_price': current_price,
-                'original_price': original_price,
-                'threshold': data['threshold'],
-                'previous_price': previous_price,
-                'price_change': price_change,
-                'price_change_percent': price_change_percent,
-                'last_updated': data['date']
-            }
-    
-    return list(products_dict.values())
\ No newline at end of file
+    return [dict(row) for row in c.fetchall()]
\ No newline at end of file
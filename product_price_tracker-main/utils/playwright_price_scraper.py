@@ -1,16 +1,77 @@
 import asyncio
+from datetime import datetime
 
-from playwright.async_api import Page, async_playwright
+from playwright.async_api import Browser, Page, Playwright, Route, async_playwright
 
-from utils.common import console, display_price_table, fetch_products
-from utils.db import init_db, save_price
+from utils.common import console, display_price_table
+from utils.db import init_db, list_products, save_prices_bulk
 
 from .email_reports import send_report
 from .scrape_amazon import scrape_amazon
 from .scrape_flipkart import scrape_flipkart
 
 CHECK_INTERVAL = 60 * 60  # check every 1 hour
-
+MAX_CONCURRENT_PAGES = 6  # products scraped in parallel, one browser context each
+
+USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/120.0.0.0 Safari/537.36"
+)
+
+# Resources price parsing never needs; aborted to cut bytes per product page
+BLOCKED_RESOURCE_TYPES = {"image", "media", "font", "stylesheet"}
+
+# Playwright driver and Chromium kept alive across scrape runs on the same event loop
+_PW: Playwright | None = None
+_BROWSER: Browser | None = None
+_browser_lock = asyncio.Lock()
+
+
+
+def install_eager_task_factory() -> None:
+    """Run new tasks eagerly on the current loop (Python 3.12+, no-op otherwise)."""
+    if hasattr(asyncio, "eager_task_factory"):
+        asyncio.get_running_loop().set_task_factory(asyncio.eager_task_factory)
+
+
+async def _get_browser() -> Browser:
+    """Return the shared browser, launching Playwright on first use."""
+    global _PW, _BROWSER
+    async with _browser_lock:
+        if _PW is None:
+            _PW = await async_playwright().start()
+        if _BROWSER is None or not _BROWSER.is_connected():
+            _BROWSER = await _PW.chromium.launch(
+                headless=True,
+                #                               ,proxy={
+                #     "server": "socks5://127.0.0.1:9050"
+                # }
+            )
+    return _BROWSER
+
+
+async def close_browser() -> None:
+    """Close the shared browser and stop Playwright.
+
+    Must run on the event loop that launched them, before that loop closes.
+    """
+    global _PW, _BROWSER
+    async with _browser_lock:
+        if _BROWSER is not None:
+            await _BROWSER.close()
+            _BROWSER = None
+        if _PW is not None:
+            await _PW.stop()
+            _PW = None
+
+
+async def _block_heavy_resources(route: Route) -> None:
+    """Abort requests for images, media, fonts and stylesheets."""
+    if route.request.resource_type in BLOCKED_RESOURCE_TYPES:
+        await route.abort()
+    else:
+        await route.continue_()
 
 
 async def scrape_product(page:Page, product:dict) -> dict | None:
@@ -63,55 +124,59 @@ async def scrape_product(page:Page, product:dict) -> dict | None:
 
 
 async def track_prices() -> None:
-    """Launch Playwright and track all products."""
-    products = fetch_products()
+    """Scrape all products using the shared Playwright browser."""
+    products = list_products()
     if not products:
         console.print("No products to track. Please add products to the PRODUCTS list.")
         return
     results = report_details = []
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            headless=True,
-            #                               ,proxy={
-            #     "server": "socks5://127.0.0.1:9050"
-            # }
-        )
-        context = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) "
-                "Chrome/120.0.0.0 Safari/537.36"
-            ),
-        )
-        page = await context.new_page()
-
-        for product in products:
-            info = await scrape_product(page, product)
-            if info:
-                results.append(info)
-                current_price = info["current_price"]
-                console.print(
-                    f"[cyan]{product['name']}[/] => Rs {current_price} (Threshold Rs {product['threshold']})",
-                )
-
-                # Save price to DB with original_price
-                save_price(
-                    product["name"],
-                    product["url"],
-                    product["platform"],
-                    current_price,
-                    product["threshold"],
-                    info["original_price"],
-                )
-                # Check if there is a real discount AND price meets threshold for email notification
-                if (current_price < info["original_price"]) and (
-                    current_price <= product["threshold"]
-                ):
-                    report_details.append(info)
-            else:
-                console.print(f"[X] Failed to fetch price for {product['name']}")
-
-        await browser.close()
+    to_save = []
+    browser = await _get_browser()
+    sem = asyncio.Semaphore(MAX_CONCURRENT_PAGES)
+
+    async def worker(product: dict) -> dict | None:
+        async with sem:
+            context = await browser.new_context(user_agent=USER_AGENT)
+            try:
+                await context.route("**/*", _block_heavy_resources)
+                page = await context.new_page()
+                return await scrape_product(page, product)
+            finally:
+                await context.close()
+
+    infos = await asyncio.gather(
+        *(worker(product) for product in products), return_exceptions=True,
+    )
+
+    for product, info in zip(products, infos, strict=True):
+        if isinstance(info, BaseException):
+            console.print(f"[X] Error scraping {product['name']}: {info}")
+        elif info:
+            results.append(info)
+            current_price = info["current_price"]
+            console.print(
+                f"[cyan]{product['name']}[/] => Rs {current_price} (Threshold Rs {product['threshold']})",
+            )
+
+            # Queue price for a single bulk insert with original_price
+            to_save.append((
+                product["name"],
+                product["url"],
+                product["platform"],
+                current_price,
+                info["original_price"],
+                product["threshold"],
+                datetime.now(),
+            ))
+            # Check if there is a real discount AND price meets threshold for email notification
+            if (current_price < info["original_price"]) and (
+                current_price <= product["threshold"]
+            ):
+                report_details.append(info)
+        else:
+            console.print(f"[X] Failed to fetch price for {product['name']}")
+
+    save_prices_bulk(to_save)
 
     if results:
         display_price_table(results)
@@ -132,11 +197,15 @@ async def track_prices() -> None:
 
 async def main() -> None:
     """Start the price tracking process."""
+    install_eager_task_factory()
     init_db()
-    await track_prices()
+    try:
+        await track_prices()
+    finally:
+        await close_browser()
 
 
 if __name__ == "__main__":
-    asyncio.run(track_prices())
+    asyncio.run(main())
     # while True:
     #     time.sleep(CHECK_INTERVAL)
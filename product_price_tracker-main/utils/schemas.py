@@ -0,0 +1,32 @@
+"""Request payload models for the Flask API."""
+
+from typing import Literal, Self
+
+from pydantic import BaseModel, ConfigDict, Field, field_validator, model_validator
+from pydantic_core import PydanticCustomError
+
+
+class ProductIn(BaseModel):
+    """Payload for adding a product to track."""
+
+    model_config = ConfigDict(str_strip_whitespace=True)
+
+    name: str = Field(min_length=1)
+    url: str = Field(min_length=1)
+    platform: Literal["amazon", "flipkart"]
+    threshold: float = Field(gt=0)
+
+    @field_validator("platform", mode="before")
+    @classmethod
+    def lowercase_platform(cls, value: object) -> object:
+        """Accept platform names in any case and with surrounding whitespace."""
+        return value.strip().lower() if isinstance(value, str) else value
+
+    @model_validator(mode="after")
+    def url_matches_platform(self) -> Self:
+        """Require the URL to belong to the selected platform."""
+        if self.platform not in self.url.lower():
+            raise PydanticCustomError(
+                "url_platform", "URL must be from {platform}", {"platform": self.platform},
+            )
+        return self
@@ -0,0 +1,18 @@
+"""WSGI entry point for serving the API with Gunicorn (see gunicorn.conf.py)."""
+
+import fcntl
+
+from app import app, start_background_jobs
+from utils.db import DB_PATH
+
+# Every worker imports this module; only the one holding the lock runs the scrape
+# scheduler, so prices are scraped once per deployment rather than once per worker.
+_jobs_lock = open(DB_PATH.with_suffix(".lock"), "w")  # held open for the process lifetime
+try:
+    fcntl.flock(_jobs_lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+except BlockingIOError:
+    pass
+else:
+    start_background_jobs()
+
+__all__ = ["app"]